@@ -42,18 +42,23 @@ __email__ = 'ilyarazmanov@gmail.com'
 __status__ = 'Production'
 
 import random
+from array import array
+from itertools import compress
 from time import ctime, time
 from tkinter import BOTH, PhotoImage, Tk, filedialog
 from tkinter.ttk import Progressbar
 
 import png  # PNG reading: PyPNG from: https://gitlab.com/drj11/pypng
 
+# Window icon, 4x4 PPM, random colors picked once and frozen
+icon_data = b'P6\n4 4\n255\n' b'\x0b\x3a\xab\x15\x35\x57\x49\xc8\x09\xd7\xbb\x19\xcf\xe9\x43\x86\xbe\xd2\x78\xf4\x96\x80\x45\xfc\xbc\x6b\x6b\xf9\x0f\xf5\xfb\x24\xf1\xf0\xaf\x89\xc4\x48\xac\x02\x93\xeb\x57\xdf\xd3\xa1\x16\x5d'
+
 # Creating dialog {#888888, 10}
 sortir = Tk()
 sortir.title('POVRay Mosaic: 36Zaika')
 sortir.geometry(f'500x16+{(sortir.winfo_screenwidth()-500)//2}+{(sortir.winfo_screenheight()-16)//2}')
 sortir.resizable(width=True, height=True)
-sortir.iconphoto(True, PhotoImage(data='P6\n4 4\n255\n'.encode(encoding='ascii') + random.randbytes(48)))
+sortir.iconphoto(True, PhotoImage(data=icon_data))
 progressbar = Progressbar(sortir, orient='horizontal', mode='determinate', value=0, maximum=100, length=500)
 progressbar.pack(fill=BOTH, expand=True)
 sortir.overrideredirect(True)
@@ -79,6 +84,14 @@ if info['bitdepth'] == 8:
 if info['bitdepth'] == 16:
     maxcolors = 65535  # Maximal value for 16-bit channel
 
+# Every possible channel value normalized to 0..1 and formatted once as ready to write bytes,
+# to be looked up instead of dividing and formatting per thingie.
+# 4 decimals are enough to tell 8-bit values apart, 6 decimals for 16-bit
+if maxcolors == 255:
+    channel_bytes = tuple(b'%.4f' % (i / maxcolors) for i in range(maxcolors + 1))
+else:
+    channel_bytes = tuple(b'%.6f' % (i / maxcolors) for i in range(maxcolors + 1))
+
 if 'gamma' in info:
     gamma_note = f'Source PNG gAMA value is {info['gamma']}'
 else:
@@ -97,205 +110,180 @@ if (resultfilename == '') or (sourcefilename is None):
     sortir.destroy()
     quit()
 
-# open POV file
-resultfile = open(resultfilename, 'w')
+# open POV file in binary mode with large buffer, header text is encoded explicitly, thingies are built as bytes
+resultfile = open(resultfilename, 'wb', buffering=1048576)
 
 
-def src(x, y, z):  # {#884400, 19}
+def src_lum_row(y):  # {#884400, 19}
     '''
-    Analog of src from FM, force repeat edge instead of out of range.
-    Returns int channel value z for pixel x, y
-
-    '''
-
-    cx = int(x)
-    cy = int(y)
-    cx = max(0, cx)
-    cx = min((X - 1), cx)
-    cy = max(0, cy)
-    cy = min((Y - 1), cy)
-
-    # Here is the main magic of turning two x, z into one array position
-    position = (cx * Z) + z
-    channelvalue = int((imagedata[cy])[position])
-
-    return channelvalue
-
-
-# end of src function
-
+    Returns compact array of brightness of all pixels in row y, force repeat edge instead of out of range
 
-def src_lum(x, y):  # {#884400, 19}
     '''
-    Returns brightness of pixel x, y
 
-    '''
+    row = imagedata[min(max(int(y), 0), Y - 1)]
 
-    if info['planes'] < 3:  # supposedly L and LA
-        yntensity = src(x, y, 0)
+    if Z < 3:  # supposedly L and LA
+        yntensity_row = array('H', list(row[0::Z]))  # list, or 8-bit bytearray would be taken as raw bytes
     else:  # supposedly RGB and RGBA
-        yntensity = int(0.2989 * src(x, y, 0) + 0.587 * src(x, y, 1) + 0.114 * src(x, y, 2))
-
-    return yntensity
-
+        # 0.2989, 0.587, 0.114 weights as 16-bit fixed point, integer only math
+        yntensity_row = array('H', [(19589 * r + 38470 * g + 7471 * b) >> 16 for r, g, b in zip(row[0::Z], row[1::Z], row[2::Z])])
 
-# end of src_lum function
-
-
-def src_lum_blin(x, y):  # {#884400, 25}
-    '''
-    Analog of src_lum above, but returns bilinearly interpolated brightness of pixel x, y
-
-    '''
-
-    fx = float(x)
-    fy = float(y)  # Uses float input coordinates for interpolation
-
-    # Neighbor pixels coordinates (square corners x0,y0; x1,y0; x0,y1; x1,y1)
-    x0 = int(x)
-    x1 = x0 + 1
-    y0 = int(y)
-    y1 = y0 + 1
+    return yntensity_row
 
-    # Reading corners src (see scr above) and interpolating    # {#880000, 3}
-    channelvalue = (
-        src_lum(x0, y0) * (x1 - fx) * (y1 - fy) + src_lum(x0, y1) * (x1 - fx) * (fy - y0) + src_lum(x1, y0) * (fx - x0) * (y1 - fy) + src_lum(x1, y1) * (fx - x0) * (fy - y0)
-    )
 
-    return int(channelvalue)
-
-
-# end of src_lum_blin function
+# end of src_lum_row function
 
 # WRITING POV FILE  # {#ff0000}
 
 seconds = time()
 localtime = ctime(seconds)  # will be used for randomization and for debug info
 
-resultfile.writelines(  # POV header start {#660000}
-    [
-        '/*\n',
-        'Persistence of Vision Ray Tracer Scene Description File\n',
-        'Version: 3.7\n',
-        'Description: Mosaic picture consisting from solid spheres, triangle packing, Regular plane partition 3/6.\n',
-        'Author: Automatically generated by 36zaika program, based on AmphiSoft POV Sphere Mosaic plug-in, see POVRay Mosaic project at\n',
-        'https://github.com/Dnyarri/POVmosaic\n',
-        'https://gitflic.ru/project/dnyarri/povmosaic\n\n',
-        'developed by Ilya Razmanov aka Ilyich the Toad\n',
-        'https://dnyarri.github.io\n',
-        'mailto:ilyarazmanov@gmail.com\n\n',
-        f'Generated by: {__file__} ver: {__version__} at: {localtime}\n' f'Converted from: {sourcefilename}\n' f'Source info: {info}\n' '*/\n\n',
-    ]
+resultfile.write(  # POV header start {#660000}
+    (
+        '/*\n'
+        'Persistence of Vision Ray Tracer Scene Description File\n'
+        'Version: 3.7\n'
+        'Description: Mosaic picture consisting from solid spheres, triangle packing, Regular plane partition 3/6.\n'
+        'Author: Automatically generated by 36zaika program, based on AmphiSoft POV Sphere Mosaic plug-in, see POVRay Mosaic project at\n'
+        'https://github.com/Dnyarri/POVmosaic\n'
+        'https://gitflic.ru/project/dnyarri/povmosaic\n\n'
+        'developed by Ilya Razmanov aka Ilyich the Toad\n'
+        'https://dnyarri.github.io\n'
+        'mailto:ilyarazmanov@gmail.com\n\n'
+        f'Generated by: {__file__} ver: {__version__} at: {localtime}\n' f'Converted from: {sourcefilename}\n' f'Source info: {info}\n' '*/\n\n'
+    ).encode(encoding='utf-8')
 )
 
-resultfile.writelines(  # Globals {#660000}
-    [
-        '\n',
-        '#version 3.7;\n\n',
-        'global_settings{\n',
-        '    max_trace_level 3   // Small to speed up preview. May need to be increased for metals\n',
-        '    adc_bailout 0.01    // High to speed up preview. May need to be decreased to 1/256\n',
-        f'    assumed_gamma 1.0   // {gamma_note}, that may or may not be of value.\n',
-        '    ambient_light <0.5, 0.5, 0.5>\n',
-        '    charset utf8\n',
-        '}\n\n',
-        '#include "finish.inc"\n',
-        '#include "metals.inc"\n',
-        '#include "golds.inc"\n',
-        '#include "glass.inc"\n',
-        '#include "functions.inc"\n',
-        '\n',
-    ]
+resultfile.write(  # Globals {#660000}
+    (
+        '\n'
+        '#version 3.7;\n\n'
+        'global_settings{\n'
+        '    max_trace_level 3   // Small to speed up preview. May need to be increased for metals\n'
+        '    adc_bailout 0.01    // High to speed up preview. May need to be decreased to 1/256\n'
+        f'    assumed_gamma 1.0   // {gamma_note}, that may or may not be of value.\n'
+        '    ambient_light <0.5, 0.5, 0.5>\n'
+        '    charset utf8\n'
+        '}\n\n'
+        '#include "finish.inc"\n'
+        '#include "metals.inc"\n'
+        '#include "golds.inc"\n'
+        '#include "glass.inc"\n'
+        '#include "functions.inc"\n'
+        '\n'
+    ).encode(encoding='utf-8')
 )
 #   POV header end
 
 # --------------------------------
 # Thingie element, then scene
-resultfile.writelines(
-    [
-        '\n// Necessary math stuff set as de facto constants to avoid importing math\n',
-        '#declare sqrtof3 = 1.7320508075688772935274463415059;      // sqrt(3)\n',
-        '#declare sqrtof3div2 = 0.86602540378443864676372317075294; // sqrt(3)/2\n\n',
-        '\n/*  -------------------------\n    |  Predefined variants  |\n    -------------------------  */\n',
-        '\n//       Thingie variants\n',
-        '#declare thingie_1 = prism {\n    linear_sweep\n    linear_spline\n    -1,\n    0,\n    4,\n    <-1.0, sqrtof3div2>, <1.0, sqrtof3div2>, <0, -sqrtof3div2>, <-1.0, sqrtof3div2>\n    rotate x*90 translate z\n}\n',
-        '#declare thingie_2 = prism {\n    conic_sweep\n    linear_spline\n    -1,\n    0,\n    4,\n    <-1.0, sqrtof3div2>, <1.0, sqrtof3div2>, <0, -sqrtof3div2>, <-1.0, sqrtof3div2>\n    rotate x*90 translate z\n}\n',
-        '#declare thingie_3 = difference {\n    object {thingie_2}\n    object {thingie_2 scale<1, 1, -1.0> translate<0, 0, 1.0>}\n}  // WARNING: CSG of two previously defined objects depends on them!\n',
-        '\n//       Thingie finish variants\n',
-        '#declare thingie_finish_1 = finish{ambient 0.1 diffuse 0.7 specular 0.8 reflection 0 roughness 0.005}  // Smooth plastic\n',
-        '#declare thingie_finish_2 = finish{phong 0.1 phong_size 1} // Dull, good color representation\n',
-        '#declare thingie_finish_3 = finish{ambient 0.1 diffuse 0.5 specular 1\n    roughness 0.01 metallic reflection {0.75 metallic}}    // Metallic example\n',
-        '#declare thingie_finish_4 = finish{ambient 0.1 diffuse 0.5 reflection 0.1 specular 1 roughness 0.005\n    irid {0.5 thickness 0.9 turbulence 0.9}}    // Iridescence example\n',
-        '\n//       Thingie normal variants\n',
-        '#declare thingie_normal_1 = normal{function {1}}  // Constant normal placeholder, template for function\n',
-        '#declare thingie_normal_2 = normal{bumps 1.0 scale<0.01, 0.01, 0.01>}\n',
-        '#declare thingie_normal_3 = normal{bumps 0.05 scale<1.0, 0.05, 0.5>}\n',
-        '#declare thingie_normal_4 = normal{spiral1 8 0.5 scallop_wave}\n',
-        '#declare thingie_normal_5 = normal{tiling 3 scale <0.5, 5, 0.5> rotate <90, 0, 0>}\n',
-        '\n/*  ----------------------------------------------------\n    |  Global modifiers for all thingies in the scene  |\n    ----------------------------------------------------  */\n\n',
-        '#declare thingie_texture_2 = texture {  // Define transparent texture overlay here\n',
-        '  pigment {gradient z colour_map {[0.0, rgbt <0,0,0,1>] [1.0, rgbt <0,0,0,1>]} scale 0.1 rotate <30, 30, 0>}};\n\n',  # Transparent texture overlay
-        '#declare yes_color = 1;         // Whether source per-thingie color is taken or global patten applied\n',
-        '// Color-relater settings below work only for "yes_color = 1;"\n',
-        '#declare cm = function(k) {k}   // Color transfer function for all channels, all thingies\n',
-        '#declare f_val = 0.0;           // Filter value for all thingies\n',
-        '#declare t_val = 0.0;           // Transmit value for all thingies\n',
-        '\n/*       Map function\nMaps are transfer functions control value (i.e. source pixel brightness) is passed through.\n',
-        'By default exported map is five points linear spline, control points are set in the table below,\n',
-        'first column is input, first digits in second column is output for this input.\n',
-        'Note that by default input=output, i.e. no changes applied to source pixel brightness. */\n\n',
-        '#declare Curve = function {  // Spline curve construction begins\n',
-        '  spline { linear_spline\n',
-        '    0.0,   <0.0,   0>\n',
-        '    0.25,  <0.25,  0>\n',
-        '    0.5,   <0.5,   0>\n',
-        '    0.75,  <0.75,  0>\n',
-        '    1.0,   <1.0,   0>}\n  }  // Construction complete\n',
-        '#declare map = function(c) {Curve(c).u}  // Spline curve assigned as map\n',
-        '\n/*  -------------------------------------------\n    |  Selecting variants, configuring scene  |\n    -------------------------------------------  */\n\n',
-        '#declare thingie = thingie_1\n',
-        '#declare thingie_finish = thingie_finish_1\n',
-        '#declare thingie_normal = thingie_normal_1\n',
-        '\n//       Per-thingie modifiers\n',
-        f'#declare move_map = <0, 0, 0>;    // To move thingies depending on map. Additive, no constrains on values. Source image size is {max(X, Y)}\n',
-        '#declare scale_map = <0, 0, 0>;   // To rescale thingies depending on map. Additive, no constrains on values except object overlap on x,y\n',
-        '#declare rotate_map = <0, 0, 0>;  // To rotate thingies depending on map. Values in degrees\n',
-        '#declare move_rnd = <0, 0, 0>;    // To move thingies randomly. No constrains on values\n',
-        '#declare rotate_rnd = <0, 0, 0>;  // To rotate thingies randomly. Values in degrees\n',
-        '\n//       Per-thingie normal modifiers\n',
-        '#declare normal_move_rnd = <0, 0, 0>;    // Random move of normal map. No constrains on values\n',
-        '#declare normal_rotate_rnd = <0, 0, 0>;  // Random rotate of normal map. Values in degrees\n',
-        '\n/*  --------------------------------------------------\n    |  Some properties for whole thething and scene  |\n    --------------------------------------------------  */\n\n',
-        '//       Common interior for the whole thething, fade_distance set to thingie size before scale_map etc.\n',
-        f'#declare thething_interior = interior {{ior 2.0 fade_power 1.5 fade_distance 1.0*{1.0/max(X, Y)} fade_color <0.0, 0.5, 1.0>}}\n',
-        '//       Common transform for the whole thething, placed here just to avoid scrolling\n',
-        '#declare thething_transform = transform {\n  // You can place your global scale, rotate etc. here\n}\n',
-        '\n//       Seed random\n',
-        f'#declare rnd_1 = seed({int(seconds * 1000000)});\n\n',
-        'background{color rgbft <0, 0, 0, 1, 1>} // Hey, I' 'm just trying to be explicit in here!\n\n',
+resultfile.write(
+    (
+        '\n// Necessary math stuff set as de facto constants to avoid importing math\n'
+        '#declare sqrtof3 = 1.7320508075688772935274463415059;      // sqrt(3)\n'
+        '#declare sqrtof3div2 = 0.86602540378443864676372317075294; // sqrt(3)/2\n\n'
+        '\n/*  -------------------------\n    |  Predefined variants  |\n    -------------------------  */\n'
+        '\n//       Thingie variants\n'
+        '#declare thingie_1 = prism {\n    linear_sweep\n    linear_spline\n    -1,\n    0,\n    4,\n    <-1.0, sqrtof3div2>, <1.0, sqrtof3div2>, <0, -sqrtof3div2>, <-1.0, sqrtof3div2>\n    rotate x*90 translate z\n}\n'
+        '#declare thingie_2 = prism {\n    conic_sweep\n    linear_spline\n    -1,\n    0,\n    4,\n    <-1.0, sqrtof3div2>, <1.0, sqrtof3div2>, <0, -sqrtof3div2>, <-1.0, sqrtof3div2>\n    rotate x*90 translate z\n}\n'
+        '#declare thingie_3 = difference {\n    object {thingie_2}\n    object {thingie_2 scale<1, 1, -1.0> translate<0, 0, 1.0>}\n}  // WARNING: CSG of two previously defined objects depends on them!\n'
+        '\n//       Thingie finish variants\n'
+        '#declare thingie_finish_1 = finish{ambient 0.1 diffuse 0.7 specular 0.8 reflection 0 roughness 0.005}  // Smooth plastic\n'
+        '#declare thingie_finish_2 = finish{phong 0.1 phong_size 1} // Dull, good color representation\n'
+        '#declare thingie_finish_3 = finish{ambient 0.1 diffuse 0.5 specular 1\n    roughness 0.01 metallic reflection {0.75 metallic}}    // Metallic example\n'
+        '#declare thingie_finish_4 = finish{ambient 0.1 diffuse 0.5 reflection 0.1 specular 1 roughness 0.005\n    irid {0.5 thickness 0.9 turbulence 0.9}}    // Iridescence example\n'
+        '\n//       Thingie normal variants\n'
+        '#declare thingie_normal_1 = normal{function {1}}  // Constant normal placeholder, template for function\n'
+        '#declare thingie_normal_2 = normal{bumps 1.0 scale<0.01, 0.01, 0.01>}\n'
+        '#declare thingie_normal_3 = normal{bumps 0.05 scale<1.0, 0.05, 0.5>}\n'
+        '#declare thingie_normal_4 = normal{spiral1 8 0.5 scallop_wave}\n'
+        '#declare thingie_normal_5 = normal{tiling 3 scale <0.5, 5, 0.5> rotate <90, 0, 0>}\n'
+        '\n/*  ----------------------------------------------------\n    |  Global modifiers for all thingies in the scene  |\n    ----------------------------------------------------  */\n\n'
+        '#declare thingie_texture_2 = texture {  // Define transparent texture overlay here\n'
+        '  pigment {gradient z colour_map {[0.0, rgbt <0,0,0,1>] [1.0, rgbt <0,0,0,1>]} scale 0.1 rotate <30, 30, 0>}};\n\n'  # Transparent texture overlay
+        '#declare yes_color = 1;         // Whether source per-thingie color is taken or global patten applied\n'
+        '// Color-relater settings below work only for "yes_color = 1;"\n'
+        '#declare cm = function(k) {k}   // Color transfer function for all channels, all thingies\n'
+        '#declare f_val = 0.0;           // Filter value for all thingies\n'
+        '#declare t_val = 0.0;           // Transmit value for all thingies\n'
+        '\n/*       Map function\nMaps are transfer functions control value (i.e. source pixel brightness) is passed through.\n'
+        'By default exported map is five points linear spline, control points are set in the table below,\n'
+        'first column is input, first digits in second column is output for this input.\n'
+        'Note that by default input=output, i.e. no changes applied to source pixel brightness. */\n\n'
+        '#declare Curve = function {  // Spline curve construction begins\n'
+        '  spline { linear_spline\n'
+        '    0.0,   <0.0,   0>\n'
+        '    0.25,  <0.25,  0>\n'
+        '    0.5,   <0.5,   0>\n'
+        '    0.75,  <0.75,  0>\n'
+        '    1.0,   <1.0,   0>}\n  }  // Construction complete\n'
+        '#declare map = function(c) {Curve(c).u}  // Spline curve assigned as map\n'
+        '\n/*  -------------------------------------------\n    |  Selecting variants, configuring scene  |\n    -------------------------------------------  */\n\n'
+        '#declare thingie = thingie_1\n'
+        '#declare thingie_finish = thingie_finish_1\n'
+        '#declare thingie_normal = thingie_normal_1\n'
+        '\n//       Per-thingie modifiers\n'
+        f'#declare move_map = <0, 0, 0>;    // To move thingies depending on map. Additive, no constrains on values. Source image size is {max(X, Y)}\n'
+        '#declare scale_map = <0, 0, 0>;   // To rescale thingies depending on map. Additive, no constrains on values except object overlap on x,y\n'
+        '#declare rotate_map = <0, 0, 0>;  // To rotate thingies depending on map. Values in degrees\n'
+        '#declare move_rnd = <0, 0, 0>;    // To move thingies randomly. No constrains on values\n'
+        '#declare rotate_rnd = <0, 0, 0>;  // To rotate thingies randomly. Values in degrees\n'
+        '\n//       Per-thingie normal modifiers\n'
+        '#declare normal_move_rnd = <0, 0, 0>;    // Random move of normal map. No constrains on values\n'
+        '#declare normal_rotate_rnd = <0, 0, 0>;  // Random rotate of normal map. Values in degrees\n'
+        '\n/*  --------------------------------------------------\n    |  Some properties for whole thething and scene  |\n    --------------------------------------------------  */\n\n'
+        '//       Common interior for the whole thething, fade_distance set to thingie size before scale_map etc.\n'
+        f'#declare thething_interior = interior {{ior 2.0 fade_power 1.5 fade_distance 1.0*{1.0/max(X, Y)} fade_color <0.0, 0.5, 1.0>}}\n'
+        '//       Common transform for the whole thething, placed here just to avoid scrolling\n'
+        '#declare thething_transform = transform {\n  // You can place your global scale, rotate etc. here\n}\n'
+        '\n//       Seed random\n'
+        f'#declare rnd_1 = seed({int(seconds * 1000000)});\n\n'
+        'background{color rgbft <0, 0, 0, 1, 1>} // Hey, I' 'm just trying to be explicit in here!\n\n'
         # Camera {#ff0000, 0}
-        '\n/*\n  Camera and light\n\n',
-        'NOTE: Coordinate system match Photoshop,\norigin is top left, z points to the viewer.\nsky vector is important!\n\n*/\n\n',
-        '#declare camera_position = <0.0, 0.0, 3.0>;  // Camera position over object, used for view angle\n\n',
-        'camera{\n',
-        '//  orthographic\n',
-        '  location camera_position\n',
-        '  right x*image_width/image_height\n',
-        '  up y\n',
-        '  sky <0, -1, 0>\n',
-        f'  direction <0, 0, vlength(camera_position - <0.0, 0.0, {1.0/max(X, Y)}>)>  // May alone work for many pictures. Otherwise fiddle with angle below\n',
-        f'  angle 2.0*(degrees(atan2({0.5 * max(X+0.5, Y+0.5)/X}, vlength(camera_position - <0.0, 0.0, {1.0/max(X, Y)}>)))) // Supposed to fit object, unless thingies are too high\n',
-        '  look_at<0.0, 0.0, 0.0>\n',
-        '}\n\n',
+        '\n/*\n  Camera and light\n\n'
+        'NOTE: Coordinate system match Photoshop,\norigin is top left, z points to the viewer.\nsky vector is important!\n\n*/\n\n'
+        '#declare camera_position = <0.0, 0.0, 3.0>;  // Camera position over object, used for view angle\n\n'
+        'camera{\n'
+        '//  orthographic\n'
+        '  location camera_position\n'
+        '  right x*image_width/image_height\n'
+        '  up y\n'
+        '  sky <0, -1, 0>\n'
+        f'  direction <0, 0, vlength(camera_position - <0.0, 0.0, {1.0/max(X, Y)}>)>  // May alone work for many pictures. Otherwise fiddle with angle below\n'
+        f'  angle 2.0*(degrees(atan2({0.5 * max(X+0.5, Y+0.5)/X}, vlength(camera_position - <0.0, 0.0, {1.0/max(X, Y)}>)))) // Supposed to fit object, unless thingies are too high\n'
+        '  look_at<0.0, 0.0, 0.0>\n'
+        '}\n\n'
         # Light {#ff0000, 0}
-        'light_source{0*x\n  color rgb<1.1, 1.0, 1.0>\n//  area_light <1, 0, 0>, <0, 1, 0>, 5, 5 circular orient area_illumination on\n  translate<4, -2, 3>\n}\n\n',
-        'light_source{0*x\n  color rgb<0.9, 1.0, 1.0>\n//  area_light <1, 0, 0>, <0, 1, 0>, 5, 5 circular orient area_illumination on\n  translate<-2, -6, 7>\n}\n\n',
-        '\n/*  ----------------------------------------------\n    |  Insert preset to override settings above  |\n    ----------------------------------------------  */\n\n',
-        '// #include "preset.inc"    // Set path and name of your file related to scene file\n\n',
+        'light_source{0*x\n  color rgb<1.1, 1.0, 1.0>\n//  area_light <1, 0, 0>, <0, 1, 0>, 5, 5 circular orient area_illumination on\n  translate<4, -2, 3>\n}\n\n'
+        'light_source{0*x\n  color rgb<0.9, 1.0, 1.0>\n//  area_light <1, 0, 0>, <0, 1, 0>, 5, 5 circular orient area_illumination on\n  translate<-2, -6, 7>\n}\n\n'
+        '\n/*  ----------------------------------------------\n    |  Insert preset to override settings above  |\n    ----------------------------------------------  */\n\n'
+        '// #include "preset.inc"    // Set path and name of your file related to scene file\n\n'
+        # Thingie macro {#ff0000, 0}
+        '\n/*  Thingie macro, only per-thingie values are passed,\n    everything else is taken from settings above when called  */\n'
+        '#macro thingie_at(col_r, col_g, col_b, map_c, pos_x, pos_y, flip_y, even_odd)\n'
+        '    object{thingie\n'
+        '      #if (yes_color)\n'
+        '        texture{\n'
+        '          pigment{rgbft<cm(col_r), cm(col_g), cm(col_b), f_val, t_val>}\n'
+        '          finish{thingie_finish}\n'
+        '          normal{thingie_normal translate(normal_move_rnd * (<rand(rnd_1), rand(rnd_1), rand(rnd_1)>-0.5)) rotate(normal_rotate_rnd * (<rand(rnd_1), rand(rnd_1), rand(rnd_1)>-0.5))}'
+        '        }\n'  # closing base texture
+        '        texture{thingie_texture_2}\n'  # overlay texture
+        '      #end\n'
+        '      #if (flip_y) scale <1.0, -1.0, 1.0> #end  // Flipping thingies along the row\n'
+        '      scale(<1, 1, 1> + (scale_map * <map(map_c), map(map_c), map(map_c)>))\n'
+        '      rotate(rotate_map * <map(map_c), map(map_c), map(map_c)>)\n'
+        '      rotate(rotate_rnd * (<rand(rnd_1), rand(rnd_1), rand(rnd_1)-0.5>))\n'
+        '      #if (even_odd) translate <-0.5, 0, 0> #else translate <0.5, 0, 0> #end  // Mandatory shifts for Regular plane partition 3/6\n'
+        '      translate(move_map * <map(map_c), map(map_c), map(map_c)>)\n'
+        '      translate(move_rnd * (<rand(rnd_1), rand(rnd_1), rand(rnd_1)>-0.5))\n'
+        '      translate<pos_x, pos_y, 0>\n'
+        '    }\n'  # Finished thingie
+        '#end\n\n'
         # Main object
-        '\n// Object thething made out of thingies\n',
-        '#declare thething = union{\n',  # Opening big thething
-    ]
+        '\n// Object thething made out of thingies\n'
+        '#declare thething = union{\n'  # Opening big thething
+    ).encode(encoding='utf-8')
 )
 
 # Internal strings for packing change
@@ -306,92 +294,106 @@ sqrt(3) = 1.732... hardcoded to remove math export
 '''
 triangle_height = 1.7320508075688772935274463415059
 
-even_odd_string = ''  # mandatory shifts for Regular plane partition 3/6
-even_string = 'translate <-0.5, 0, 0>'
-odd_string = 'translate <0.5, 0, 0>'
+even_odd_strings = (b'0', b'1')  # mandatory shifts for Regular plane partition 3/6, passed to thingie_at macro, indexed by row parity
+flip_strings = (b'0', b'1')  # Flipping thingies along the row, indexed by column parity
+
+'''
+Thingie is drawn by thingie_at macro declared in the header,
+so only per-thingie values are substituted into the call.
+Template is bytes and filled with % operator, so no encoding is needed when writing.
+'''
+thingie_template = b'    thingie_at(%b, %b, %b, %b, %d, %b, %b, %b)\n'
 
 # Now going to cycle through image and build big thething
 Ycount = int(Y / triangle_height)
 progressbar.config(maximum=Ycount)
 
+'''
+Resampling source onto triangle lattice once. Lattice columns fall exactly on source
+columns, so nearest neighbor color sampling only needs the source row
+closest to each lattice row, and x clamping is not needed at all.
+'''
+lattice_rows = tuple(imagedata[min(int(y * triangle_height), Y - 1)] for y in range(0, Ycount, 1))
+
+# Brightness of whole source image computed once, since neighbor lattice rows share source rows
+lum_rows = tuple(src_lum_row(y) for y in range(0, Y, 1))
+
+sortir.deiconify()  # Progress window shown once before the loop
+
 for y in range(0, Ycount, 1):
-    sortir.deiconify()  # {#888888, 3}
-    progressbar.config(value=y)
-    sortir.update()
-    sortir.update_idletasks()
+    progressbar.config(value=y)  # {#888888, 2}
+    sortir.update()  # Processes idle tasks (progressbar redraw) as well as pending events
+
+    # Whole row is collected here and written at once when row is complete
+    row_parts = [b'\n  // Row %d\n' % y]
 
-    resultfile.write(f'\n  // Row {y}\n')
+    even_odd_string = even_odd_strings[y & 1]
 
-    if ((y + 1) % 2) == 0:
-        even_odd_string = even_string
-    else:
-        even_odd_string = odd_string
+    row = lattice_rows[y]
+    # Splitting interleaved row into channel planes, extended slicing of typed array runs in C
+    row_r, row_g, row_b, row_a = row[0::Z], row[1::Z], row[2::Z], row[3::Z]
 
-    for x in range(0, X, 1):
-        if ((x + 1) % 2) == 0:
-            # Flipping thingies along the row
-            flip_string = 'scale <1.0, -1.0, 1.0>'
-        else:
-            flip_string = ''
+    # Fully transparent row has nothing to draw, only row comment is written
+    if not any(row_a):
+        resultfile.write(b''.join(row_parts))
+        continue
+
+    '''
+    Lattice columns fall on source columns, so bilinear brightness interpolation
+    has only y part left. Two source rows brightness and
+    their weights are the same for the whole lattice row and are taken once.
+    '''
+    fy = y * triangle_height
+    y0 = int(fy)
+    y1 = y0 + 1
+    lum_0 = lum_rows[y0]
+    lum_1 = lum_rows[min(y1, Y - 1)]
+    w_0 = y1 - fy
+    w_1 = fy - y0
+    fy_string = b'%.4f' % fy  # Row position formatted once for all thingies in row
+
+    '''
+    Alpha dithering decided for the whole row before anything else is sampled.
+    a = 0 is transparent, a = maxcolors is opaque, random is only needed in between.
+    tobe_or_nottobe holds whether to draw thingie in place of each pixel or not,
+    and x loop below only visits pixels to be drawn.
+    '''
+    tobe_or_nottobe = [a == maxcolors or (a > 0 and a / maxcolors > random.random()) for a in row_a]
+
+    for x in compress(range(0, X, 1), tobe_or_nottobe):
+        flip_string = flip_strings[x & 1]
 
         # Colors normalized to 0..1
-        r = float(src(x, y * triangle_height, 0)) / maxcolors
-        g = float(src(x, y * triangle_height, 1)) / maxcolors
-        b = float(src(x, y * triangle_height, 2)) / maxcolors
+        r = channel_bytes[row_r[x]]
+        g = channel_bytes[row_g[x]]
+        b = channel_bytes[row_b[x]]
 
         # Something to map something to. By default - brightness, normalized to 0..1
-        # c = float(src_lum(x, y*triangle_height))/maxcolors # Nearest neighbor
-        c = float(src_lum_blin(x, y * triangle_height)) / maxcolors  # Bilinear
-
-        # alpha to be used for alpha dithering
-        a = float(src(x, y * triangle_height, 3)) / maxcolors
-        # a = 0 is transparent, a = 1.0 is opaque
-        tobe_or_nottobe = a > random.random()
-
-        # whether to draw thingie in place of partially transparent pixel or not
-        if tobe_or_nottobe:
-            # Opening object "thingie" to draw
-            resultfile.writelines(
-                [
-                    '    object{thingie\n',
-                    '      #if (yes_color)\n',
-                    '        texture{\n',
-                    f'          pigment{{rgbft<cm({r}), cm({g}), cm({b}), f_val, t_val>}}\n',
-                    '          finish{thingie_finish}\n',
-                    '          normal{thingie_normal translate(normal_move_rnd * (<rand(rnd_1), rand(rnd_1), rand(rnd_1)>-0.5)) rotate(normal_rotate_rnd * (<rand(rnd_1), rand(rnd_1), rand(rnd_1)>-0.5))}',
-                    '        }\n',  # closing base texture
-                    '        texture{thingie_texture_2}\n'  # overlay texture
-                    '      #end\n',
-                    f'      {flip_string}\n',
-                    f'      scale(<1, 1, 1> + (scale_map * <map({c}), map({c}), map({c})>))\n',
-                    f'      rotate(rotate_map * <map({c}), map({c}), map({c})>)\n',
-                    '      rotate(rotate_rnd * (<rand(rnd_1), rand(rnd_1), rand(rnd_1)-0.5>))\n',
-                    f'      {even_odd_string}\n',
-                    f'      translate(move_map * <map({c}), map({c}), map({c})>)\n',
-                    '      translate(move_rnd * (<rand(rnd_1), rand(rnd_1), rand(rnd_1)>-0.5))\n',
-                    f'      translate<{x}, {y*triangle_height}, 0>\n',
-                    '    }\n',
-                    # Finished thingie
-                ]
-            )
+        # c = channel_bytes[lum_0[x]]  # Nearest neighbor
+        c = channel_bytes[int(lum_0[x] * w_0 + lum_1[x] * w_1)]  # Bilinear
+
+        # Drawing thingie by macro call
+        row_parts.append(thingie_template % (r, g, b, c, x, fy_string, flip_string, even_odd_string))
+
+    resultfile.write(b''.join(row_parts))
 
 # Transform object to fit 1, 1, 1 cube at 0, 0, 0 coordinates
-resultfile.writelines(
-    [
-        '\n  // Object transforms to fit 1, 1, 1 cube at 0, 0, 0 coordinates\n',
-        f'  translate <0.25, 1.5, 0> + <{-0.5*X}, {-0.5*Y}, 0>\n',  # centering at scene zero
-        f'  scale<{1.0/(max(X, Y)-2)}, {1.0/(max(X, Y)-2)}, {1.0/(max(X, Y)-2)}>\n',  # fitting
+resultfile.write(
+    (
+        '\n  // Object transforms to fit 1, 1, 1 cube at 0, 0, 0 coordinates\n'
+        f'  translate <0.25, 1.5, 0> + <{-0.5*X}, {-0.5*Y}, 0>\n'  # centering at scene zero
+        f'  scale<{1.0/(max(X, Y)-2)}, {1.0/(max(X, Y)-2)}, {1.0/(max(X, Y)-2)}>\n'  # fitting
         '} // thething closed\n\n'
         '\nobject {thething\n'  # inserting thething
-        '  #if (yes_color < 1)\n',
-        '    pigment {color rgb<0.5, 0.5, 0.5>}\n',
-        '    finish {thingie_finish}\n',
-        '  #end\n',
-        '  interior {thething_interior}\n',
-        '  transform {thething_transform}\n',
-        '}\n',  # insertion complete
-        '\n/*\n\nhappy rendering\n\n  0~0\n (---)\n(.>|<.)\n-------\n\n*/',
-    ]
+        '  #if (yes_color < 1)\n'
+        '    pigment {color rgb<0.5, 0.5, 0.5>}\n'
+        '    finish {thingie_finish}\n'
+        '  #end\n'
+        '  interior {thething_interior}\n'
+        '  transform {thething_transform}\n'
+        '}\n'  # insertion complete
+        '\n/*\n\nhappy rendering\n\n  0~0\n (---)\n(.>|<.)\n-------\n\n*/'
+    ).encode(encoding='utf-8')
 )
 # Closed scene
 
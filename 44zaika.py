@@ -46,19 +46,23 @@ __maintainer__ = 'Ilya Razmanov'
 __email__ = 'ilyarazmanov@gmail.com'
 __status__ = 'Production'
 
-import random
+from itertools import compress
+from random import random
 from time import ctime, time
 from tkinter import BOTH, PhotoImage, Tk, filedialog
 from tkinter.ttk import Progressbar
 
 import png  # PNG reading: PyPNG from: https://gitlab.com/drj11/pypng
 
+# Window icon, 4x4 PPM, random colors picked once and frozen
+icon_data = b'P6\n4 4\n255\n' b'\x8c\x77\xa4\xe4\x12\x79\x49\x87\x42\x7e\x8d\xfb\x40\x96\x53\xde\x12\x8b\xd1\x39\xc6\xa2\xab\x54\x95\x46\x9d\xe6\x07\xf1\xc6\x7d\xdd\x6a\x1d\x82\x38\x04\xe5\xf6\x04\x34\xc1\x38\xf1\x49\xd7\xf0'
+
 # Creating dialog {#888888, 10}
 sortir = Tk()
 sortir.title('POVRay Mosaic: 44Zaika')
 sortir.geometry(f'500x16+{(sortir.winfo_screenwidth()-500)//2}+{(sortir.winfo_screenheight()-16)//2}')
 sortir.resizable(width=True, height=True)
-sortir.iconphoto(True, PhotoImage(data='P6\n4 4\n255\n'.encode(encoding='ascii') + random.randbytes(48)))
+sortir.iconphoto(True, PhotoImage(data=icon_data))
 progressbar = Progressbar(sortir, orient='horizontal', mode='determinate', value=0, maximum=100, length=500)
 progressbar.pack(fill=BOTH, expand=True)
 sortir.overrideredirect(True)
@@ -84,6 +88,9 @@ if info['bitdepth'] == 8:
 if info['bitdepth'] == 16:
     maxcolors = 65535  # Maximal value for 16-bit channel
 
+# Every possible alpha value normalized to 0..1 once, to be looked up instead of dividing per pixel
+alpha_normalized = tuple(i / maxcolors for i in range(maxcolors + 1))
+
 if 'gamma' in info:
     gamma_note = f'Source PNG gAMA value is {info['gamma']}'
 else:
@@ -102,279 +109,264 @@ if (resultfilename == '') or (resultfilename is None):
     sortir.destroy()
     quit()
 
-# open POV file
-resultfile = open(resultfilename, 'w')
+# open POV file with large buffer to collapse per-thingie writes into few big ones
+resultfile = open(resultfilename, 'w', encoding='utf-8', buffering=1048576)
 
 
-def src(x, y, z):  # {#884400, 19}
+def src_lum_row(y):  # {#884400, 19}
     '''
-    Analog of src from FM, force repeat edge instead of out of range.
-    Returns int channel value z for pixel x, y
+    Returns list of brightness of all pixels in row y, force repeat edge instead of out of range
 
     '''
 
-    cx = int(x)
-    cy = int(y)
-    cx = max(0, cx)
-    cx = min((X - 1), cx)
-    cy = max(0, cy)
-    cy = min((Y - 1), cy)
-
-    # Here is the main magic of turning two x, z into one array position
-    position = (cx * Z) + z
-    channelvalue = int((imagedata[cy])[position])
-
-    return channelvalue
-
-
-# end of src function
-
-
-def src_lum(x, y):  # {#884400, 19}
-    '''
-    Returns brightness of pixel x, y
-
-    '''
+    row = imagedata[min(max(int(y), 0), Y - 1)]
 
     if info['planes'] < 3:  # supposedly L and LA
-        yntensity = src(x, y, 0)
+        yntensity_row = list(row[0::Z])
     else:  # supposedly RGB and RGBA
-        yntensity = int(0.2989 * src(x, y, 0) + 0.587 * src(x, y, 1) + 0.114 * src(x, y, 2))
+        # 0.2989, 0.587, 0.114 weights as 16-bit fixed point, integer only math
+        yntensity_row = [(19589 * r + 38470 * g + 7471 * b) >> 16 for r, g, b in zip(row[0::Z], row[1::Z], row[2::Z])]
 
-    return yntensity
+    return yntensity_row
 
 
-# end of src_lum function
+# end of src_lum_row function
 
 # WRITING POV FILE  # {#ff0000}
 
 seconds = time()
 localtime = ctime(seconds)  # will be used for randomization and for debug info
 
-resultfile.writelines(  # POV header start {#660000}
-    [
-        '/*\n',
-        'Persistence of Vision Ray Tracer Scene Description File\n',
-        'Version: 3.7\n',
-        'Description: Mosaic picture consisting from solid boxes, square packing, Regular plane partition 4/4.\n',
-        '             Other included objects are cylinders, spheres, etc.\n',
-        '             see list "#declare thingie_1=" and below.\n',
-        'Author: Automatically generated by 44zaika program, based on AmphiSoft POV Sphere Mosaic plug-in, see POVRay Mosaic project at\n',
-        'https://github.com/Dnyarri/POVmosaic\n',
-        'https://gitflic.ru/project/dnyarri/povmosaic\n\n',
-        'developed by Ilya Razmanov aka Ilyich the Toad\n',
-        'https://dnyarri.github.io\n',
-        'mailto:ilyarazmanov@gmail.com\n\n',
-        f'Generated by: {__file__} ver: {__version__} at: {localtime}\n'
-        f'Converted from: {sourcefilename}\n'
-        f'Source info: {info}\n'
-        '*/\n\n',
-    ]
+resultfile.write(  # POV header start {#660000}
+    '/*\n'
+    'Persistence of Vision Ray Tracer Scene Description File\n'
+    'Version: 3.7\n'
+    'Description: Mosaic picture consisting from solid boxes, square packing, Regular plane partition 4/4.\n'
+    '             Other included objects are cylinders, spheres, etc.\n'
+    '             see list "#declare thingie_1=" and below.\n'
+    'Author: Automatically generated by 44zaika program, based on AmphiSoft POV Sphere Mosaic plug-in, see POVRay Mosaic project at\n'
+    'https://github.com/Dnyarri/POVmosaic\n'
+    'https://gitflic.ru/project/dnyarri/povmosaic\n\n'
+    'developed by Ilya Razmanov aka Ilyich the Toad\n'
+    'https://dnyarri.github.io\n'
+    'mailto:ilyarazmanov@gmail.com\n\n'
+    f'Generated by: {__file__} ver: {__version__} at: {localtime}\n'
+    f'Converted from: {sourcefilename}\n'
+    f'Source info: {info}\n'
+    '*/\n\n'
 )
 
-resultfile.writelines(  # Globals {#660000}
-    [
-        '\n',
-        '#version 3.7;\n\n',
-        'global_settings{\n',
-        '    max_trace_level 3   // Small to speed up preview. May need to be increased for metals\n',
-        '    adc_bailout 0.01    // High to speed up preview. May need to be decreased to 1/256\n',
-        f'    assumed_gamma 1.0   // {gamma_note}, that may or may not be of value.\n',
-        '    ambient_light <0.5, 0.5, 0.5>\n',
-        '    charset utf8\n',
-        '}\n\n',
-        '#include "finish.inc"\n',
-        '#include "metals.inc"\n',
-        '#include "golds.inc"\n',
-        '#include "glass.inc"\n',
-        '#include "functions.inc"\n',
-        '\n',
-    ]
+resultfile.write(  # Globals {#660000}
+    '\n'
+    '#version 3.7;\n\n'
+    'global_settings{\n'
+    '    max_trace_level 3   // Small to speed up preview. May need to be increased for metals\n'
+    '    adc_bailout 0.01    // High to speed up preview. May need to be decreased to 1/256\n'
+    f'    assumed_gamma 1.0   // {gamma_note}, that may or may not be of value.\n'
+    '    ambient_light <0.5, 0.5, 0.5>\n'
+    '    charset utf8\n'
+    '}\n\n'
+    '#include "finish.inc"\n'
+    '#include "metals.inc"\n'
+    '#include "golds.inc"\n'
+    '#include "glass.inc"\n'
+    '#include "functions.inc"\n'
+    '\n'
 )
 #   POV header end
 
 # --------------------------------
 # Thingie element, then scene
-resultfile.writelines(
-    [
-        '\n/*  -------------------------\n    |  Predefined variants  |\n    -------------------------  */\n',
-        '\n//       Thingie variants\n',
-        '#declare thingie_1 = box{<-0.5, -0.5, -0.5>, <0.5, 0.5, 0.5>}\n',
-        '#declare thingie_2 = sphere{<0, 0, 0>, 0.5}\n',
-        '#declare thingie_3 = cylinder{<0, 0, 0>, <0, 0, 1.0>, 0.5}\n',
-        '#declare thingie_4 = superellipsoid{<0.5, 0.5> scale 0.5}\n',
-        '// CSG example below, tetragonal bipyramid\n',
-        '#declare thingie_5 = union{\n  prism{conic_sweep linear_spline 0.5, 1, 5, \n    <-0.5, -0.5>, <-0.5, 0.5>, <0.5, 0.5>, <0.5, -0.5>, <-0.5, -0.5> translate<0, -1, 0>}\n  prism{conic_sweep linear_spline -1, -0.5, 5,\n    <-0.5, -0.5>, <-0.5, 0.5>, <0.5, 0.5>, <0.5, -0.5>, <-0.5, -0.5> translate<0, 1, 0>}\n  rotate x*90}\n',
-        '// CSG examples below, may be good for randomly rotated thingies\n',  # CSG
-        '#declare thingie_6 = intersection{\n    cylinder{<0, 0, -1.0>, <0, 0, 1.0>, 0.5}\n    cylinder{<0, 0, -1.0>, <0, 0, 1.0>, 0.5 rotate x*90}\n    cylinder{<0, 0, -1.0>, <0, 0, 1.0>, 0.5 rotate y*90}\n  }  //  Cubic rounded CSG end\n',
-        '#declare thingie_7 = intersection{\n    cylinder{<0, -1.0, 0>, <0, 1.0, 0>, 0.5}\n    cylinder{<0, -1.0, 0>, <0, 1.0, 0>, 0.5 rotate z*109.5}\n    cylinder{<0, -1.0, 0>, <0, 1.0, 0>, 0.5 rotate z*109.5 rotate y*109.5}\n    cylinder{<0, -1.0, 0>, <0, 1.0, 0>, 0.5 rotate z*109.5 rotate y*219.0}\n  }  //  Tetrahedral rounded CSG end\n',
-        '#declare thingie_8 = isosurface{function{f_rounded_box(x, y, z, 0.11, 0.5, 0.5, 0.5)}}  // First float is roundness, three others - size\n',
-        '\n//       Thingie finish variants\n',
-        '#declare thingie_finish_1 = finish{ambient 0.1 diffuse 0.7 specular 0.8 reflection 0 roughness 0.005}  // Smooth plastic\n',
-        '#declare thingie_finish_2 = finish{phong 0.1 phong_size 1} // Dull, good color representation\n',
-        '#declare thingie_finish_3 = finish{ambient 0.1 diffuse 0.5 specular 1\n    roughness 0.01 metallic reflection {0.75 metallic}}    // Metallic example\n',
-        '#declare thingie_finish_4 = finish{ambient 0.1 diffuse 0.5 reflection 0.1 specular 1 roughness 0.005\n    irid {0.5 thickness 0.9 turbulence 0.5}}    // Iridescence example\n',
-        '\n//       Thingie normal variants\n',
-        '#declare thingie_normal_1 = normal{function {1}}  // Constant normal placeholder, template for function\n',
-        '#declare thingie_normal_2 = normal{bumps 1.0 scale<0.01, 0.01, 0.01>}\n',
-        '#declare thingie_normal_3 = normal{bumps 0.05 scale<1.0, 0.05, 0.5>}\n',
-        '#declare thingie_normal_4 = normal{spiral1 8 0.5 scallop_wave}\n',
-        '#declare counts = 8; #declare thingie_normal_5 = normal{function{mod(abs(cos(counts*x)+cos(-counts*y)+cos(counts*z)), 1)}}\n',
-        '#declare thingie_normal_6 = normal{function{mod(8*sqrt(pow(x,2)+pow(y,2)+pow(z,2)), 1.0)}}\n',
-        '\n/*  ----------------------------------------------------\n    |  Global modifiers for all thingies in the scene  |\n    ----------------------------------------------------  */\n\n',
-        '#declare thingie_texture_2 = texture {  // Define transparent texture overlay here\n',
-        '  pigment {gradient z colour_map {[0.0, rgbt <0,0,0,1>] [1.0, rgbt <0,0,0,1>]} scale 0.1 rotate <30, 30, 0>}};\n\n',  # Transparent texture overlay
-        '#declare yes_color = 1;         // Whether source per-thingie color is taken or global patten applied\n',
-        '// Color-relater settings below work only for "yes_color = 1;"\n',
-        '#declare cm = function(k) {k}   // Color transfer function for all channels, all thingies\n',
-        '#declare f_val = 0.0;           // Filter value for all thingies\n',
-        '#declare t_val = 0.0;           // Transmit value for all thingies\n',
-        '\n#declare evenodd_rotate = <0.0, 0.0, 0.0>;  // Odd lines rotate, rarely useful\n',
-        '#declare evenodd_offset = <0.5, 0, 0>;      // Even lines shift for brick wall\n',
-        '#declare evenodd_offset = <0.0, 0, 0>;      // Default 0 even lines shift for no brick wall\n',
-        '#declare scale_all = <1, 1, 1>;             // Base scale of all thingies. 1=original\n',
-        '#declare rotate_all = <0, 0, 0>;            // Base rotation of all thingies. Values in degrees\n',
-        '\n/*       Map function\nMaps are transfer functions control value (i.e. source pixel brightness) is passed through.\n',
-        'By default exported map is five points linear spline, control points are set in the table below,\n',
-        'first column is input, first digits in second column is output for this input.\n',
-        'Note that by default input=output, i.e. no changes applied to source pixel brightness. */\n\n',
-        '#declare Curve = function {  // Spline curve construction begins\n',
-        '  spline { linear_spline\n',
-        '    0.0,   <0.0,   0>\n',
-        '    0.25,  <0.25,  0>\n',
-        '    0.5,   <0.5,   0>\n',
-        '    0.75,  <0.75,  0>\n',
-        '    1.0,   <1.0,   0>}\n  }  // Construction complete\n',
-        '#declare map = function(c) {Curve(c).u}  // Spline curve assigned as map\n',
-        '\n/*  -------------------------------------------\n    |  Selecting variants, configuring scene  |\n    -------------------------------------------  */\n\n',
-        '#declare thingie = thingie_8  // Default set to isosurface thingie_8 to give you favorable first impression\n',
-        '#declare thingie_finish = thingie_finish_1\n',
-        '#declare thingie_normal = thingie_normal_1\n',
-        '\n//       Per-thingie modifiers\n',
-        f'#declare move_map = <0, 0, 0>;    // To move thingies depending on map. Additive, no constrains on values. Source image size is {max(X, Y)}\n',
-        '#declare scale_map = <0, 0, 0>;   // To rescale thingies depending on map. Additive, no constrains on values except object overlap on x,y\n',
-        '#declare rotate_map = <0, 0, 0>;  // To rotate thingies depending on map. Values in degrees\n',
-        '#declare move_rnd = <0, 0, 0>;    // To move thingies randomly. No constrains on values\n',
-        '#declare rotate_rnd = <0, 0, 0>;  // To rotate thingies randomly. Values in degrees\n',
-        '\n//       Per-thingie normal modifiers\n',
-        '#declare normal_move_rnd = <0, 0, 0>;    // Random move of normal map. No constrains on values\n',
-        '#declare normal_rotate_rnd = <0, 0, 0>;  // Random rotate of normal map. Values in degrees\n',
-        '\n/*  --------------------------------------------------\n    |  Some properties for whole thething and scene  |\n    --------------------------------------------------  */\n\n',
-        '//       Common interior for the whole thething, fade_distance set to thingie size before scale_map etc.\n',
-        f'#declare thething_interior = interior {{ior 2.0 fade_power 1.5 fade_distance 1.0*{1.0/max(X, Y)} fade_color <0.0, 0.5, 1.0>}}\n',
-        '//       Common transform for the whole thething, placed here just to avoid scrolling\n',
-        '#declare thething_transform = transform {\n  // You can place your global scale, rotate etc. here\n}\n',
-        '\n//       Seed random\n',
-        f'#declare rnd_1 = seed({int(seconds * 1000000)});\n\n',
-        'background{color rgbft <0, 0, 0, 1, 1>} // Hey, I' 'm just trying to be explicit in here!\n\n',
-        # Camera {#ff0000, 0}
-        '\n/*\n  Camera and light\n\n',
-        'NOTE: Coordinate system match Photoshop,\norigin is top left, z points to the viewer.\nsky vector is important!\n\n*/\n\n',
-        '#declare camera_position = <0.0, 0.0, 3.0>;  // Camera position over object, used for view angle\n\n',
-        'camera{\n',
-        '//  orthographic\n',
-        '  location camera_position\n',
-        '  right x*image_width/image_height\n',
-        '  up y\n',
-        '  sky <0, -1, 0>\n',
-        f'  direction <0, 0, vlength(camera_position - <0.0, 0.0, {1.0/max(X, Y)}>)>  // May alone work for many pictures. Otherwise fiddle with angle below\n',
-        f'  angle 2.0*(degrees(atan2({0.5 * max(X, Y)/X}, vlength(camera_position - <0.0, 0.0, {1.0/max(X, Y)}>)))) // Supposed to fit object, unless thingies are too high\n',
-        '  look_at<0.0, 0.0, 0.0>\n',
-        '}\n\n',
-        # Light {#ff0000, 0}
-        'light_source{0*x\n  color rgb<1.1, 1.0, 1.0>\n//  area_light <1, 0, 0>, <0, 1, 0>, 5, 5 circular orient area_illumination on\n  translate<4, -2, 3>\n}\n\n',
-        'light_source{0*x\n  color rgb<0.9, 1.0, 1.0>\n//  area_light <1, 0, 0>, <0, 1, 0>, 5, 5 circular orient area_illumination on\n  translate<-2, -6, 7>\n}\n\n',
-        '\n/*  ----------------------------------------------\n    |  Insert preset to override settings above  |\n    ----------------------------------------------  */\n\n',
-        '// #include "preset.inc"    // Set path and name of your file related to scene file\n\n',
-        # Main object
-        '\n// Object thething made out of thingies\n',
-        '#declare thething = union{\n',  # Opening big thething
-    ]
+resultfile.write(
+    '\n/*  -------------------------\n    |  Predefined variants  |\n    -------------------------  */\n'
+    '\n//       Thingie variants\n'
+    '#declare thingie_1 = box{<-0.5, -0.5, -0.5>, <0.5, 0.5, 0.5>}\n'
+    '#declare thingie_2 = sphere{<0, 0, 0>, 0.5}\n'
+    '#declare thingie_3 = cylinder{<0, 0, 0>, <0, 0, 1.0>, 0.5}\n'
+    '#declare thingie_4 = superellipsoid{<0.5, 0.5> scale 0.5}\n'
+    '// CSG example below, tetragonal bipyramid\n'
+    '#declare thingie_5 = union{\n  prism{conic_sweep linear_spline 0.5, 1, 5, \n    <-0.5, -0.5>, <-0.5, 0.5>, <0.5, 0.5>, <0.5, -0.5>, <-0.5, -0.5> translate<0, -1, 0>}\n  prism{conic_sweep linear_spline -1, -0.5, 5,\n    <-0.5, -0.5>, <-0.5, 0.5>, <0.5, 0.5>, <0.5, -0.5>, <-0.5, -0.5> translate<0, 1, 0>}\n  rotate x*90}\n'
+    '// CSG examples below, may be good for randomly rotated thingies\n'  # CSG
+    '#declare thingie_6 = intersection{\n    cylinder{<0, 0, -1.0>, <0, 0, 1.0>, 0.5}\n    cylinder{<0, 0, -1.0>, <0, 0, 1.0>, 0.5 rotate x*90}\n    cylinder{<0, 0, -1.0>, <0, 0, 1.0>, 0.5 rotate y*90}\n  }  //  Cubic rounded CSG end\n'
+    '#declare thingie_7 = intersection{\n    cylinder{<0, -1.0, 0>, <0, 1.0, 0>, 0.5}\n    cylinder{<0, -1.0, 0>, <0, 1.0, 0>, 0.5 rotate z*109.5}\n    cylinder{<0, -1.0, 0>, <0, 1.0, 0>, 0.5 rotate z*109.5 rotate y*109.5}\n    cylinder{<0, -1.0, 0>, <0, 1.0, 0>, 0.5 rotate z*109.5 rotate y*219.0}\n  }  //  Tetrahedral rounded CSG end\n'
+    '#declare thingie_8 = isosurface{function{f_rounded_box(x, y, z, 0.11, 0.5, 0.5, 0.5)}}  // First float is roundness, three others - size\n'
+    '\n//       Thingie finish variants\n'
+    '#declare thingie_finish_1 = finish{ambient 0.1 diffuse 0.7 specular 0.8 reflection 0 roughness 0.005}  // Smooth plastic\n'
+    '#declare thingie_finish_2 = finish{phong 0.1 phong_size 1} // Dull, good color representation\n'
+    '#declare thingie_finish_3 = finish{ambient 0.1 diffuse 0.5 specular 1\n    roughness 0.01 metallic reflection {0.75 metallic}}    // Metallic example\n'
+    '#declare thingie_finish_4 = finish{ambient 0.1 diffuse 0.5 reflection 0.1 specular 1 roughness 0.005\n    irid {0.5 thickness 0.9 turbulence 0.5}}    // Iridescence example\n'
+    '\n//       Thingie normal variants\n'
+    '#declare thingie_normal_1 = normal{function {1}}  // Constant normal placeholder, template for function\n'
+    '#declare thingie_normal_2 = normal{bumps 1.0 scale<0.01, 0.01, 0.01>}\n'
+    '#declare thingie_normal_3 = normal{bumps 0.05 scale<1.0, 0.05, 0.5>}\n'
+    '#declare thingie_normal_4 = normal{spiral1 8 0.5 scallop_wave}\n'
+    '#declare counts = 8; #declare thingie_normal_5 = normal{function{mod(abs(cos(counts*x)+cos(-counts*y)+cos(counts*z)), 1)}}\n'
+    '#declare thingie_normal_6 = normal{function{mod(8*sqrt(pow(x,2)+pow(y,2)+pow(z,2)), 1.0)}}\n'
+    '\n/*  ----------------------------------------------------\n    |  Global modifiers for all thingies in the scene  |\n    ----------------------------------------------------  */\n\n'
+    '#declare thingie_texture_2 = texture {  // Define transparent texture overlay here\n'
+    '  pigment {gradient z colour_map {[0.0, rgbt <0,0,0,1>] [1.0, rgbt <0,0,0,1>]} scale 0.1 rotate <30, 30, 0>}};\n\n'  # Transparent texture overlay
+    '#declare yes_color = 1;         // Whether source per-thingie color is taken or global patten applied\n'
+    '// Color-relater settings below work only for "yes_color = 1;"\n'
+    '#declare cm = function(k) {k}   // Color transfer function for all channels, all thingies\n'
+    '#declare f_val = 0.0;           // Filter value for all thingies\n'
+    '#declare t_val = 0.0;           // Transmit value for all thingies\n'
+    '\n#declare evenodd_rotate = <0.0, 0.0, 0.0>;  // Odd lines rotate, rarely useful\n'
+    '#declare evenodd_offset = <0.5, 0, 0>;      // Even lines shift for brick wall\n'
+    '#declare evenodd_offset = <0.0, 0, 0>;      // Default 0 even lines shift for no brick wall\n'
+    '#declare scale_all = <1, 1, 1>;             // Base scale of all thingies. 1=original\n'
+    '#declare rotate_all = <0, 0, 0>;            // Base rotation of all thingies. Values in degrees\n'
+    '\n/*       Map function\nMaps are transfer functions control value (i.e. source pixel brightness) is passed through.\n'
+    'By default exported map is five points linear spline, control points are set in the table below,\n'
+    'first column is input, first digits in second column is output for this input.\n'
+    'Note that by default input=output, i.e. no changes applied to source pixel brightness. */\n\n'
+    '#declare Curve = function {  // Spline curve construction begins\n'
+    '  spline { linear_spline\n'
+    '    0.0,   <0.0,   0>\n'
+    '    0.25,  <0.25,  0>\n'
+    '    0.5,   <0.5,   0>\n'
+    '    0.75,  <0.75,  0>\n'
+    '    1.0,   <1.0,   0>}\n  }  // Construction complete\n'
+    '#declare map = function(c) {Curve(c).u}  // Spline curve assigned as map\n'
+    '\n/*  -------------------------------------------\n    |  Selecting variants, configuring scene  |\n    -------------------------------------------  */\n\n'
+    '#declare thingie = thingie_8  // Default set to isosurface thingie_8 to give you favorable first impression\n'
+    '#declare thingie_finish = thingie_finish_1\n'
+    '#declare thingie_normal = thingie_normal_1\n'
+    '\n//       Per-thingie modifiers\n'
+    f'#declare move_map = <0, 0, 0>;    // To move thingies depending on map. Additive, no constrains on values. Source image size is {max(X, Y)}\n'
+    '#declare scale_map = <0, 0, 0>;   // To rescale thingies depending on map. Additive, no constrains on values except object overlap on x,y\n'
+    '#declare rotate_map = <0, 0, 0>;  // To rotate thingies depending on map. Values in degrees\n'
+    '#declare move_rnd = <0, 0, 0>;    // To move thingies randomly. No constrains on values\n'
+    '#declare rotate_rnd = <0, 0, 0>;  // To rotate thingies randomly. Values in degrees\n'
+    '\n//       Per-thingie normal modifiers\n'
+    '#declare normal_move_rnd = <0, 0, 0>;    // Random move of normal map. No constrains on values\n'
+    '#declare normal_rotate_rnd = <0, 0, 0>;  // Random rotate of normal map. Values in degrees\n'
+    '\n/*  --------------------------------------------------\n    |  Some properties for whole thething and scene  |\n    --------------------------------------------------  */\n\n'
+    '//       Common interior for the whole thething, fade_distance set to thingie size before scale_map etc.\n'
+    f'#declare thething_interior = interior {{ior 2.0 fade_power 1.5 fade_distance 1.0*{1.0/max(X, Y)} fade_color <0.0, 0.5, 1.0>}}\n'
+    '//       Common transform for the whole thething, placed here just to avoid scrolling\n'
+    '#declare thething_transform = transform {\n  // You can place your global scale, rotate etc. here\n}\n'
+    '\n//       Seed random\n'
+    f'#declare rnd_1 = seed({int(seconds * 1000000)});\n\n'
+    'background{color rgbft <0, 0, 0, 1, 1>} // Hey, I' 'm just trying to be explicit in here!\n\n'
+    # Camera {#ff0000, 0}
+    '\n/*\n  Camera and light\n\n'
+    'NOTE: Coordinate system match Photoshop,\norigin is top left, z points to the viewer.\nsky vector is important!\n\n*/\n\n'
+    '#declare camera_position = <0.0, 0.0, 3.0>;  // Camera position over object, used for view angle\n\n'
+    'camera{\n'
+    '//  orthographic\n'
+    '  location camera_position\n'
+    '  right x*image_width/image_height\n'
+    '  up y\n'
+    '  sky <0, -1, 0>\n'
+    f'  direction <0, 0, vlength(camera_position - <0.0, 0.0, {1.0/max(X, Y)}>)>  // May alone work for many pictures. Otherwise fiddle with angle below\n'
+    f'  angle 2.0*(degrees(atan2({0.5 * max(X, Y)/X}, vlength(camera_position - <0.0, 0.0, {1.0/max(X, Y)}>)))) // Supposed to fit object, unless thingies are too high\n'
+    '  look_at<0.0, 0.0, 0.0>\n'
+    '}\n\n'
+    # Light {#ff0000, 0}
+    'light_source{0*x\n  color rgb<1.1, 1.0, 1.0>\n//  area_light <1, 0, 0>, <0, 1, 0>, 5, 5 circular orient area_illumination on\n  translate<4, -2, 3>\n}\n\n'
+    'light_source{0*x\n  color rgb<0.9, 1.0, 1.0>\n//  area_light <1, 0, 0>, <0, 1, 0>, 5, 5 circular orient area_illumination on\n  translate<-2, -6, 7>\n}\n\n'
+    '\n/*  ----------------------------------------------\n    |  Insert preset to override settings above  |\n    ----------------------------------------------  */\n\n'
+    '// #include "preset.inc"    // Set path and name of your file related to scene file\n\n'
+    # Thingie macro {#ff0000, 0}
+    '\n/*  Thingie macro, only per-thingie values are passed,\n    everything else is taken from settings above when called.\n'
+    '    Colors and map value are passed as source integer channel values, normalized to 0..1 here  */\n'
+    f'#declare channel_max = {maxcolors};  // Maximal value for source channel\n'
+    '#macro thingie_at(col_r, col_g, col_b, map_c, pos_x, pos_y, even_odd)\n'
+    '    #local mc = map(map_c / channel_max);  // Map evaluated once per thingie\n'
+    '    object{thingie\n'
+    '      #if (yes_color)\n'
+    '        texture{\n'
+    '          pigment{rgbft<cm(col_r / channel_max), cm(col_g / channel_max), cm(col_b / channel_max), f_val, t_val>}\n'
+    '          finish{thingie_finish}\n'
+    '          normal{thingie_normal translate(normal_move_rnd * (<rand(rnd_1), rand(rnd_1), rand(rnd_1)>-0.5)) rotate(normal_rotate_rnd * (<rand(rnd_1), rand(rnd_1), rand(rnd_1)>-0.5))}'
+    '        }\n'  # closing base texture
+    '        texture{thingie_texture_2}\n'  # overlay texture
+    '      #end\n'
+    '      scale(scale_all + (scale_map * <mc, mc, mc>))\n'
+    '      #if (!even_odd) rotate evenodd_rotate #end  // Odd rows rotated\n'
+    '      rotate((rotate_map * <mc, mc, mc>) + rotate_all)\n'
+    '      rotate(rotate_rnd * (<rand(rnd_1), rand(rnd_1), rand(rnd_1)-0.5>))\n'
+    '      #if (even_odd) translate evenodd_offset #end  // Even rows shifted\n'
+    '      translate(move_map * <mc, mc, mc>)\n'
+    '      translate(move_rnd * (<rand(rnd_1), rand(rnd_1), rand(rnd_1)>-0.5))\n'
+    '      translate<pos_x, pos_y, 0>\n'
+    '    }\n'  # Finished thingie
+    '#end\n\n'
+    # Main object
+    '\n// Object thething made out of thingies\n'
+    '#declare thething = union{\n'  # Opening big thething
 )
 
-# Internal strings for packing change {#ff0000, 0}
-even_string_trn = 'translate evenodd_offset'
-odd_string_trn = ''
-even_string_rot = ''
-odd_string_rot = 'rotate evenodd_rotate'
+# Internal strings for packing change, passed to thingie_at macro {#ff0000, 0}
+even_string = '1'
+odd_string = '0'
+
+'''
+Thingie is drawn by thingie_at macro declared in the header,
+so only per-thingie values are substituted into the call.
+Template is filled with % operator: integer r, g, b, c, x, then row tail holding y and even/odd switch.
+'''
+thingie_template = '    thingie_at(%d, %d, %d, %d, %d, %s)\n'
 
 # Now going to cycle through image and build big thething
 
 progressbar.config(maximum=Y)
 
+sortir.deiconify()  # Progress window shown once before the loop
+
 for y in range(0, Y, 1):
-    sortir.deiconify()  # {#888888, 3}
-    progressbar.config(value=y)
-    sortir.update()
-    sortir.update_idletasks()
+    progressbar.config(value=y)  # {#888888, 2}
+    sortir.update()  # Processes idle tasks (progressbar redraw) as well as pending events
 
-    resultfile.write(f'\n  // Row {y}\n')
+    # Whole row text is collected here and written at once when row is complete
+    row_parts = []
 
     if ((y + 1) % 2) == 0:
-        even_odd_string_trn = even_string_trn
-        even_odd_string_rot = even_string_rot
+        even_odd_string = even_string
     else:
-        even_odd_string_trn = odd_string_trn
-        even_odd_string_rot = odd_string_rot
-
-    for x in range(0, X, 1):
-        # Colors normalized to 0..1
-        r = float(src(x, y, 0)) / maxcolors
-        g = float(src(x, y, 1)) / maxcolors
-        b = float(src(x, y, 2)) / maxcolors
-
-        # Something to map something to. By default - brightness, normalized to 0..1
-        c = float(src_lum(x, y)) / maxcolors
-
-        # alpha to be used for alpha dithering
-        a = float(src(x, y, 3)) / maxcolors
-        # a = 0 is transparent, a = 1.0 is opaque
-        tobe_or_nottobe = a > random.random()
-
-        # whether to draw thingie in place of partially transparent pixel or not
-        if tobe_or_nottobe:
-            # Opening object "thingie" to draw
-            resultfile.writelines(
-                [
-                    '    object{thingie\n',
-                    '      #if (yes_color)\n',
-                    '        texture{\n',
-                    f'          pigment{{rgbft<cm({r}), cm({g}), cm({b}), f_val, t_val>}}\n',
-                    '          finish{thingie_finish}\n',
-                    '          normal{thingie_normal translate(normal_move_rnd * (<rand(rnd_1), rand(rnd_1), rand(rnd_1)>-0.5)) rotate(normal_rotate_rnd * (<rand(rnd_1), rand(rnd_1), rand(rnd_1)>-0.5))}',
-                    '        }\n',  # closing base texture
-                    '        texture{thingie_texture_2}\n'  # overlay texture
-                    '      #end\n',
-                    f'      scale(scale_all + (scale_map * <map({c}), map({c}), map({c})>))\n',
-                    f'      {even_odd_string_rot}\n',
-                    f'      rotate((rotate_map * <map({c}), map({c}), map({c})>) + rotate_all)\n',
-                    '      rotate(rotate_rnd * (<rand(rnd_1), rand(rnd_1), rand(rnd_1)-0.5>))\n',
-                    f'      {even_odd_string_trn}\n',
-                    f'      translate(move_map * <map({c}), map({c}), map({c})>)\n',
-                    '      translate(move_rnd * (<rand(rnd_1), rand(rnd_1), rand(rnd_1)>-0.5))\n',
-                    f'      translate<{x}, {y}, 0>\n',
-                    '    }\n',
-                    # Finished thingie
-                ]
-            )
+        even_odd_string = odd_string
+
+    # Values constant along the row formatted once, leaving only per-thingie fields
+    row_tail = f'{y}, {even_odd_string}'
+
+    row = imagedata[y]
+    # Splitting interleaved row into channel planes, extended slicing of typed array runs in C
+    row_r, row_g, row_b, row_a = row[0::Z], row[1::Z], row[2::Z], row[3::Z]
+    # Brightness of whole row computed at once
+    lum_row = src_lum_row(y)
+
+    '''
+    Alpha dithering decided for the whole row before anything else is sampled.
+    a = 0 is transparent, a = maxcolors is opaque, random is only needed in between.
+    tobe_or_nottobe holds whether to draw thingie in place of each pixel or not,
+    and x loop below only visits pixels to be drawn.
+    '''
+    tobe_or_nottobe = [a == maxcolors or (a > 0 and alpha_normalized[a] > random()) for a in row_a]
+
+    # Channel planes and brightness walked in step by zip instead of indexing each by x
+    for x, r, g, b, c in compress(zip(range(0, X, 1), row_r, row_g, row_b, lum_row), tobe_or_nottobe):
+        # Drawing thingie by macro call, integer values are normalized to 0..1 by the macro
+        row_parts.append(thingie_template % (r, g, b, c, x, row_tail))
+
+    # Row comment is written only for rows having anything drawn
+    if row_parts:
+        resultfile.write(f'\n  // Row {y}\n' + ''.join(row_parts))
 
 # Transform object to fit 1, 1, 1 cube at 0, 0, 0 coordinates
-resultfile.writelines(
-    [
-        '\n  // Object transforms to fit 1, 1, 1 cube at 0, 0, 0 coordinates\n',
-        f'  translate <0.5, 0.5, 0> + <{-0.5*X}, {-0.5*Y}, 0>\n',  # centering at scene zero
-        f'  scale<{1.0/max(X, Y)}, {1.0/max(X, Y)}, {1.0/max(X, Y)}>\n',  # fitting
-        '} // thething closed\n\n'
-        '\nobject {thething\n'  # inserting thething
-        '  #if (yes_color < 1)\n',
-        '    pigment {color rgb<0.5, 0.5, 0.5>}\n',
-        '    finish {thingie_finish}\n',
-        '  #end\n',
-        '  interior {thething_interior}\n',
-        '  transform {thething_transform}\n',
-        '}\n',  # insertion complete
-        '\n/*\n\nhappy rendering\n\n  0~0\n (---)\n(.>|<.)\n-------\n\n*/',
-    ]
+resultfile.write(
+    '\n  // Object transforms to fit 1, 1, 1 cube at 0, 0, 0 coordinates\n'
+    f'  translate <0.5, 0.5, 0> + <{-0.5*X}, {-0.5*Y}, 0>\n'  # centering at scene zero
+    f'  scale<{1.0/max(X, Y)}, {1.0/max(X, Y)}, {1.0/max(X, Y)}>\n'  # fitting
+    '} // thething closed\n\n'
+    '\nobject {thething\n'  # inserting thething
+    '  #if (yes_color < 1)\n'
+    '    pigment {color rgb<0.5, 0.5, 0.5>}\n'
+    '    finish {thingie_finish}\n'
+    '  #end\n'
+    '  interior {thething_interior}\n'
+    '  transform {thething_transform}\n'
+    '}\n'  # insertion complete
+    '\n/*\n\nhappy rendering\n\n  0~0\n (---)\n(.>|<.)\n-------\n\n*/'
 )
 # Closed scene
 
@@ -50,18 +50,22 @@ __email__ = 'ilyarazmanov@gmail.com'
 __status__ = 'Production'
 
 import random
+from array import array
 from time import ctime, time
 from tkinter import BOTH, PhotoImage, Tk, filedialog
 from tkinter.ttk import Progressbar
 
 import png  # PNG reading: PyPNG from: https://gitlab.com/drj11/pypng
 
+# Window icon, 4x4 PPM, random colors picked once and frozen
+icon_data = b'P6\n4 4\n255\n' b'\x8a\xb7\xfa\x41\x98\x48\xf8\x1e\x07\xcc\xb8\x25\x2d\x94\x5f\x38\xa3\xbb\xaf\x80\x3b\x5a\x61\x37\xdf\x1e\x90\x85\xb6\x30\x7e\xb6\xb0\x94\xf4\xd7\x14\x8c\x1e\x49\xb8\xad\x89\x66\x73\x94\xfc\x84'
+
 # Creating dialog {#888888, 10}
 sortir = Tk()
 sortir.title('POVRay Mosaic: 63Zaika')
 sortir.geometry(f'500x16+{(sortir.winfo_screenwidth()-500)//2}+{(sortir.winfo_screenheight()-16)//2}')
 sortir.resizable(width=True, height=True)
-sortir.iconphoto(True, PhotoImage(data='P6\n4 4\n255\n'.encode(encoding='ascii') + random.randbytes(48)))
+sortir.iconphoto(True, PhotoImage(data=icon_data))
 progressbar = Progressbar(sortir, orient='horizontal', mode='determinate', value=0, maximum=100, length=500)
 progressbar.pack(fill=BOTH, expand=True)
 sortir.overrideredirect(True)
@@ -87,6 +91,10 @@ if info['bitdepth'] == 8:
 if info['bitdepth'] == 16:
     maxcolors = 65535  # Maximal value for 16-bit channel
 
+# Every possible channel value normalized to 0..1 and formatted once,
+# to be looked up instead of dividing and formatting per thingie
+channel_string = tuple(f'{float(i) / maxcolors}' for i in range(maxcolors + 1))
+
 if 'gamma' in info:
     gamma_note = f'Source PNG gAMA value is {info['gamma']}'
 else:
@@ -105,75 +113,27 @@ if (resultfilename == '') or (sourcefilename is None):
     sortir.destroy()
     quit()
 
-# open POV file
-resultfile = open(resultfilename, 'w')
+# open POV file with large buffer to collapse per-thingie writes into few big ones
+resultfile = open(resultfilename, 'w', buffering=1048576)
 
 
-def src(x, y, z):  # {#884400, 19}
-    '''
-    Analog of src from FM, force repeat edge instead of out of range.
-    Returns int channel value z for pixel x, y
-
+def src_lum_row(y):  # {#884400, 19}
     '''
+    Returns compact array of brightness of all pixels in row y, force repeat edge instead of out of range
 
-    cx = int(x)
-    cy = int(y)
-    cx = max(0, cx)
-    cx = min((X - 1), cx)
-    cy = max(0, cy)
-    cy = min((Y - 1), cy)
-
-    # Here is the main magic of turning two x, z into one array position
-    position = (cx * Z) + z
-    channelvalue = int((imagedata[cy])[position])
-
-    return channelvalue
-
-
-# end of src function
-
-
-def src_lum(x, y):  # {#884400, 19}
     '''
-    Returns brightness of pixel x, y
 
-    '''
+    row = imagedata[min(max(int(y), 0), Y - 1)]
 
     if info['planes'] < 3:  # supposedly L and LA
-        yntensity = src(x, y, 0)
+        yntensity_row = array('H', list(row[0::Z]))  # list, or 8-bit bytearray would be taken as raw bytes
     else:  # supposedly RGB and RGBA
-        yntensity = int(0.2989 * src(x, y, 0) + 0.587 * src(x, y, 1) + 0.114 * src(x, y, 2))
-
-    return yntensity
-
-
-# end of src_lum function
-
-
-def src_lum_blin(x, y):  # {#884400, 25}
-    '''
-    Analog of src_lum above, but returns bilinearly interpolated brightness of pixel x, y
-
-    '''
-
-    fx = float(x)
-    fy = float(y)  # Uses float input coordinates for interpolation
+        yntensity_row = array('H', [int(0.2989 * r + 0.587 * g + 0.114 * b) for r, g, b in zip(row[0::Z], row[1::Z], row[2::Z])])
 
-    # Neighbor pixels coordinates (square corners x0,y0; x1,y0; x0,y1; x1,y1)
-    x0 = int(x)
-    x1 = x0 + 1
-    y0 = int(y)
-    y1 = y0 + 1
-
-    # Reading corners src (see scr above) and interpolating    # {#880000, 3}
-    channelvalue = (
-        src_lum(x0, y0) * (x1 - fx) * (y1 - fy) + src_lum(x0, y1) * (x1 - fx) * (fy - y0) + src_lum(x1, y0) * (fx - x0) * (y1 - fy) + src_lum(x1, y1) * (fx - x0) * (fy - y0)
-    )
+    return yntensity_row
 
-    return int(channelvalue)
 
-
-# end of src_lum_blin function
+# end of src_lum_row function
 
 # WRITING POV FILE  # {#ff0000}
 
@@ -336,11 +296,21 @@ odd_string = 'transform {evenodd_transform}'  # consider 'rotate<0.0, 0.0, 180.0
 Ycount = int(Y / triangle_height)
 progressbar.config(maximum=Ycount)
 
+'''
+Lattice columns fall exactly on source columns, so nearest neighbor color sampling
+only needs the source row closest to each lattice row.
+Brightness of whole source image is computed once, since neighbor lattice rows share source rows.
+Brightness rows shifted by one pixel, repeating last pixel, give right neighbors for bilinear interpolation.
+'''
+lattice_rows = tuple(imagedata[min(int(y * triangle_height), Y - 1)] for y in range(0, Ycount, 1))
+lum_rows = tuple(src_lum_row(y) for y in range(0, Y, 1))
+lum_rows_next = tuple(lum_row[1:] + lum_row[-1:] for lum_row in lum_rows)
+
+sortir.deiconify()  # Progress window shown once before the loop
+
 for y in range(0, Ycount, 1):
-    sortir.deiconify()  # {#888888, 3}
-    progressbar.config(value=y)
-    sortir.update()
-    sortir.update_idletasks()
+    progressbar.config(value=y)  # {#888888, 2}
+    sortir.update()  # Processes idle tasks (progressbar redraw) as well as pending events
 
     resultfile.write(f'\n  // Row {y}\n')
 
@@ -351,18 +321,38 @@ for y in range(0, Ycount, 1):
         even_odd_string = odd_string
         even_odd_trans = 0.0
 
+    row = lattice_rows[y]
+    # Splitting interleaved row into channel planes, extended slicing of typed array runs in C
+    row_r, row_g, row_b, row_a = row[0::Z], row[1::Z], row[2::Z], row[3::Z]
+
+    '''
+    Bilinear brightness interpolation at x + even_odd_trans, y * triangle_height.
+    Four source brightness rows and four corner weights are the same for the whole lattice row.
+    '''
+    fy = y * triangle_height
+    y0 = int(fy)
+    y1 = y0 + 1
+    lum_00 = lum_rows[y0]
+    lum_01 = lum_rows[min(y1, Y - 1)]
+    lum_10 = lum_rows_next[y0]
+    lum_11 = lum_rows_next[min(y1, Y - 1)]
+    w_00 = (1.0 - even_odd_trans) * (y1 - fy)
+    w_01 = (1.0 - even_odd_trans) * (fy - y0)
+    w_10 = even_odd_trans * (y1 - fy)
+    w_11 = even_odd_trans * (fy - y0)
+
     for x in range(0, X, 1):
         # Colors normalized to 0..1
-        r = float(src(x, y * triangle_height, 0)) / maxcolors
-        g = float(src(x, y * triangle_height, 1)) / maxcolors
-        b = float(src(x, y * triangle_height, 2)) / maxcolors
+        r = channel_string[row_r[x]]
+        g = channel_string[row_g[x]]
+        b = channel_string[row_b[x]]
 
         # Something to map something to. By default - brightness, normalized to 0..1
-        # c = float(src_lum(x, y*triangle_height))/maxcolors # Nearest neighbor
-        c = float(src_lum_blin(x + even_odd_trans, y * triangle_height)) / maxcolors  # Bilinear
+        # c = channel_string[lum_00[x]]  # Nearest neighbor
+        c = channel_string[int(lum_00[x] * w_00 + lum_01[x] * w_01 + lum_10[x] * w_10 + lum_11[x] * w_11)]  # Bilinear
 
         # alpha to be used for alpha dithering
-        a = float(src(x, y * triangle_height, 3)) / maxcolors
+        a = float(row_a[x]) / maxcolors
         # a = 0 is transparent, a = 1.0 is opaque
         tobe_or_nottobe = a > random.random()
 
@@ -386,7 +376,7 @@ for y in range(0, Ycount, 1):
                     f'      {even_odd_string}\n',
                     f'      translate(move_map * <map({c}), map({c}), map({c})>)\n',
                     '      translate(move_rnd * (<rand(rnd_1), rand(rnd_1), rand(rnd_1)>-0.5))\n',
-                    f'      translate<{x}, {y*triangle_height}, 0>\n',
+                    f'      translate<{x}, {fy}, 0>\n',
                     '    }\n',
                     # Finished thingie
                 ]